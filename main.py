@@ -3,11 +3,22 @@ from discord.ext import commands
 from discord import app_commands
 import os
 import logging
-from groq import Groq
+from groq import AsyncGroq
 from dotenv import load_dotenv
 import asyncio
 import random
-from supabase import create_client, Client
+import time
+import hashlib
+import json
+import base64
+import zstandard as zstd
+import httpx
+import asyncpg
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable
+from cachetools import TTLCache
+from supabase import acreate_client, AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
 
 # Load local environment variables as fallback
 load_dotenv()
@@ -23,6 +34,145 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Environment variable cache: entries expire after ENV_CACHE_TTL seconds and are
+# refreshed in the background once they are older than half of that
+ENV_CACHE_SIZE = 256
+ENV_CACHE_TTL = 300
+
+# Conversation saves go through a bounded queue; one worker writes everything
+# queued within WRITE_DEBOUNCE_SECONDS in a single insert
+WRITE_QUEUE_SIZE = 1000
+WRITE_DEBOUNCE_SECONDS = 2.0
+
+# A failed batch is retried with exponential backoff before its messages are dropped
+WRITE_MAX_RETRIES = 5
+WRITE_RETRY_BACKOFF = 1.0
+
+# Number of user/assistant messages kept as context for each user
+HISTORY_LIMIT = 20
+
+# Users whose conversation is kept in memory; least recently active are evicted first
+MAX_CACHED_CONVERSATIONS = 5000
+
+# Users known to have no stored history, so their first message skips the Supabase read
+NO_HISTORY_CACHE_SIZE = 10_000
+NO_HISTORY_CACHE_TTL = 3600
+
+# HTTP connection pools (one each for Supabase and Groq); keep-alive should cover
+# the expected concurrent /ask users
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 50
+
+# Direct Postgres pool used for hot-path queries when SUPABASE_DB_URL is set
+PG_POOL_MIN_SIZE = 5
+PG_POOL_MAX_SIZE = 20
+
+# Cache of Groq replies to opening messages ("hi", "what can you do?", ...)
+RESPONSE_CACHE_SIZE = 10_000
+RESPONSE_CACHE_TTL = 3600
+
+# Upper bounds (seconds) for a single network call
+SUPABASE_TIMEOUT = 5
+GROQ_TIMEOUT = 20
+
+# Minimum seconds between Discord message edits while a reply is streaming in
+STREAM_EDIT_INTERVAL = 0.4
+
+# Seconds the /help embed is reused before its guild/user counts are rechecked
+HELP_CACHE_TTL = 30
+
+# System prompt shared by every conversation (never mutated)
+_SYSTEM_MSG = {
+    "role": "system",
+    "content": (
+        "You are Neural, an intelligent and helpful Discord bot. "
+        "You're enthusiastic and always try to be helpful. "
+        "Keep responses concise but informative. "
+        "If someone asks about your capabilities, mention that you can chat, "
+        "help with questions, and provide information on various topics."
+    )
+}
+
+def _new_http_client(timeout: float) -> httpx.AsyncClient:
+    """Create a pooled HTTP/2 client
+    
+    Each SDK gets its own client: postgrest writes its base_url and auth headers
+    onto the client it is given, so sharing one would leak them to other hosts.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        http2=True,
+        timeout=timeout
+    )
+
+# Message contents at least this long are stored zstd-compressed (base64 text)
+COMPRESS_MIN_BYTES = 512
+_ZSTD_COMPRESSOR = zstd.ZstdCompressor(level=3)
+_ZSTD_DECOMPRESSOR = zstd.ZstdDecompressor()
+
+def _encode_content(content: str) -> tuple[str, str | None]:
+    """Compress long message content, returning (stored content, encoding)"""
+    raw = content.encode()
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        compressed = base64.b64encode(_ZSTD_COMPRESSOR.compress(raw)).decode()
+        if len(compressed) < len(raw):
+            return compressed, 'zstd'
+    return content, None
+
+def _decode_content(content: str, encoding: str | None) -> str:
+    """Reverse _encode_content; rows without an encoding are plain text"""
+    if encoding == 'zstd':
+        return _ZSTD_DECOMPRESSOR.decompress(base64.b64decode(content)).decode()
+    return content
+
+# PostgREST/Postgres error codes for a table that doesn't exist
+_MISSING_TABLE_CODES = ('PGRST205', '42P01')
+
+def _is_missing_table_error(error: Exception) -> bool:
+    """Whether a Supabase error means the queried table doesn't exist"""
+    return getattr(error, 'code', None) in _MISSING_TABLE_CODES
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open"""
+
+class CircuitBreaker:
+    """Stop calling a failing service for a while after repeated errors"""
+    
+    def __init__(self, name: str, max_failures: int = 5, window: float = 60, cooldown: float = 30):
+        self.name = name
+        self.max_failures = max_failures
+        self.window = window
+        self.cooldown = cooldown
+        self._failures = deque()
+        self._open_until = 0.0
+    
+    def is_open(self) -> bool:
+        """Whether calls should currently be short-circuited"""
+        return time.monotonic() < self._open_until
+    
+    def remaining(self) -> float:
+        """Seconds until an open circuit allows calls again (0 if closed)"""
+        return max(0.0, self._open_until - time.monotonic())
+    
+    def record_success(self):
+        """Forget earlier failures after a successful call"""
+        self._failures.clear()
+    
+    def record_failure(self):
+        """Count a failure and open the circuit if there were too many within the window"""
+        now = time.monotonic()
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window:
+            self._failures.popleft()
+        
+        if len(self._failures) > self.max_failures:
+            self._open_until = now + self.cooldown
+            self._failures.clear()
+            logger.warning(f"{self.name} circuit opened for {self.cooldown}s after repeated failures")
+
 class SupabaseConfig:
     """Handle environment variables from Supabase with local fallback"""
     
@@ -30,43 +180,163 @@ class SupabaseConfig:
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_ANON_KEY')
         self.storage_mode = os.getenv('ENV_STORAGE_MODE', 'local')
-        self.supabase: Client = None
-        self._env_cache = {}
+        self.db_url = os.getenv('SUPABASE_DB_URL')
+        self.supabase: AsyncClient = None
+        self.pg_pool: asyncpg.Pool = None
+        # postgrest ignores postgrest_client_timeout when given its own client
+        self._http = _new_http_client(timeout=10)
+        self._env_cache = TTLCache(maxsize=ENV_CACHE_SIZE, ttl=ENV_CACHE_TTL)
+        self._env_fetched_at = TTLCache(maxsize=ENV_CACHE_SIZE, ttl=ENV_CACHE_TTL)
+        self._env_locks = {}
+        self._env_refresh_tasks = {}
+        # Keys in the Supabase table, known once prime_env_cache() succeeds (None until then)
+        self._env_table_keys: set[str] | None = None
+        self._write_queue: asyncio.Queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._writer_task: asyncio.Task | None = None
+        self._write_epochs: dict[int, int] = {}
+        self._breaker = CircuitBreaker('Supabase')
+        self._no_history = TTLCache(maxsize=NO_HISTORY_CACHE_SIZE, ttl=NO_HISTORY_CACHE_TTL)
+        self._legacy_table_available = True
+    
+    async def init(self):
+        """Create the async Supabase client (must run inside the event loop)"""
+        if self.supabase is not None:
+            return
         
         if self.storage_mode == 'supabase' and self.supabase_url and self.supabase_key:
             try:
-                self.supabase = create_client(self.supabase_url, self.supabase_key)
+                self.supabase = await acreate_client(
+                    self.supabase_url,
+                    self.supabase_key,
+                    options=AsyncClientOptions(httpx_client=self._http)
+                )
                 logger.info("Supabase client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Supabase client: {e}")
                 logger.info("Falling back to local environment variables")
                 self.storage_mode = 'local'
+                return
+            
+            if self.db_url:
+                try:
+                    # statement_cache_size=0 keeps prepared statements off Supavisor's pooled connections
+                    self.pg_pool = await asyncpg.create_pool(
+                        self.db_url,
+                        min_size=PG_POOL_MIN_SIZE,
+                        max_size=PG_POOL_MAX_SIZE,
+                        statement_cache_size=0,
+                        max_inactive_connection_lifetime=300,
+                        timeout=SUPABASE_TIMEOUT
+                    )
+                    logger.info("Postgres connection pool initialized successfully")
+                except Exception as e:
+                    logger.error(f"Failed to create Postgres pool: {e}")
+                    logger.info("Using PostgREST for all Supabase queries")
+            
+            self._writer_task = asyncio.create_task(self._writer_loop())
+    
+    async def _run(self, call, timeout: float = SUPABASE_TIMEOUT):
+        """Await a Supabase call with a timeout, tracking failures in the circuit breaker"""
+        if self._breaker.is_open():
+            raise CircuitOpenError("Supabase circuit is open")
+        
+        try:
+            async with asyncio.timeout(timeout):
+                result = await call()
+        except Exception:
+            self._breaker.record_failure()
+            raise
+        
+        self._breaker.record_success()
+        return result
+    
+    async def prime_env_cache(self):
+        """Load every Supabase environment variable into the cache in a single query"""
+        if self.storage_mode != 'supabase' or not self.supabase:
+            return
+        
+        try:
+            if self.pg_pool:
+                rows = await self._run(lambda: self.pg_pool.fetch(
+                    'SELECT key, value FROM environment_variables'
+                ))
+            else:
+                response = await self._run(self.supabase.table('environment_variables').select('key,value').execute)
+                rows = response.data
+            
+            for row in rows:
+                self._cache_env(row['key'], row['value'])
+            self._env_table_keys = {row['key'] for row in rows}
+            logger.info(f"Preloaded {len(rows)} environment variable(s) from Supabase")
+        except Exception as e:
+            logger.error(f"Error preloading environment variables from Supabase: {e}")
+    
+    def _cache_env(self, key: str, value: str):
+        """Store a value in the cache and remember when it was fetched"""
+        self._env_cache[key] = value
+        self._env_fetched_at[key] = time.monotonic()
     
     async def get_env_var(self, key: str, default: str = None) -> str:
         """Get environment variable from Supabase or local fallback"""
         
-        # Check cache first
-        if key in self._env_cache:
-            return self._env_cache[key]
+        # Check cache first, serving stale-ish values while refreshing in the background
+        value = self._env_cache.get(key)
+        if value is not None:
+            age = time.monotonic() - self._env_fetched_at.get(key, 0)
+            if age > ENV_CACHE_TTL / 2:
+                self._schedule_env_refresh(key, default)
+            return value
         
-        if self.storage_mode == 'supabase' and self.supabase:
+        # Only one coroutine fetches a missing key, the rest wait for its result
+        lock = self._env_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            value = self._env_cache.get(key)
+            if value is not None:
+                return value
+            return await self._fetch_env_var(key, default)
+    
+    def _schedule_env_refresh(self, key: str, default: str = None):
+        """Refresh a cached value in the background unless a refresh is already running"""
+        # Skip while Supabase is failing, so a good value isn't replaced by the local fallback
+        if key in self._env_refresh_tasks or self._breaker.is_open():
+            return
+        
+        task = asyncio.create_task(self._fetch_env_var(key, default))
+        self._env_refresh_tasks[key] = task
+        task.add_done_callback(lambda _: self._env_refresh_tasks.pop(key, None))
+    
+    async def _fetch_env_var(self, key: str, default: str = None) -> str:
+        """Fetch a value from Supabase (or the local env) and cache it"""
+        # After a successful preload the table is known, so keys not in it skip the query
+        in_table = self._env_table_keys is None or key in self._env_table_keys
+        
+        if self.storage_mode == 'supabase' and self.supabase and in_table:
             try:
                 # Try to get from Supabase environment_variables table
-                response = self.supabase.table('environment_variables').select('value').eq('key', key).execute()
+                if self.pg_pool:
+                    row = await self._run(lambda: self.pg_pool.fetchrow(
+                        'SELECT value FROM environment_variables WHERE key = $1', key
+                    ))
+                    rows = [row] if row else []
+                else:
+                    response = await self._run(self.supabase.table('environment_variables').select('value').eq('key', key).execute)
+                    rows = response.data
                 
-                if response.data and len(response.data) > 0:
-                    value = response.data[0]['value']
-                    self._env_cache[key] = value
+                if rows:
+                    value = rows[0]['value']
+                    self._cache_env(key, value)
                     return value
                 else:
                     logger.warning(f"Environment variable '{key}' not found in Supabase, using local fallback")
+                    if self._env_table_keys is not None:
+                        self._env_table_keys.discard(key)
             except Exception as e:
                 logger.error(f"Error fetching {key} from Supabase: {e}")
         
         # Fallback to local environment variables
         value = os.getenv(key, default)
         if value:
-            self._env_cache[key] = value
+            self._cache_env(key, value)
         return value
     
     def get_env_var_sync(self, key: str, default: str = None) -> str:
@@ -78,13 +348,15 @@ class SupabaseConfig:
         if self.storage_mode == 'supabase' and self.supabase:
             try:
                 # Upsert the environment variable
-                response = self.supabase.table('environment_variables').upsert({
+                response = await self._run(self.supabase.table('environment_variables').upsert({
                     'key': key,
                     'value': value
-                }).execute()
+                }).execute)
                 
                 # Update cache
-                self._env_cache[key] = value
+                self._cache_env(key, value)
+                if self._env_table_keys is not None:
+                    self._env_table_keys.add(key)
                 logger.info(f"Successfully updated environment variable '{key}' in Supabase")
                 return True
             except Exception as e:
@@ -96,61 +368,228 @@ class SupabaseConfig:
     def clear_cache(self):
         """Clear the environment variable cache"""
         self._env_cache.clear()
+        self._env_fetched_at.clear()
+    
+    # Conversation history is stored append-only, one row per message:
+    #   conversation_messages(user_id text, seq bigint generated always as identity,
+    #                         role text, content text, encoding text,
+    #                         ts timestamptz default now(), primary key (user_id, seq))
+    # encoding is 'zstd' for compressed content and null for plain text
+    #
+    # Older versions kept one JSON blob per user in user_conversations(user_id, messages);
+    # those rows are copied over the first time a user has nothing in the new table
     
     async def get_user_conversation(self, user_id: int) -> list:
-        """Get user's conversation history from Supabase"""
+        """Get user's most recent messages from Supabase (oldest first)"""
         if self.storage_mode != 'supabase' or not self.supabase:
             return []
         
+        if user_id in self._no_history:
+            return []
+        
         try:
-            response = self.supabase.table('user_conversations')\
-                .select('messages')\
-                .eq('user_id', str(user_id))\
-                .execute()
+            if self.pg_pool:
+                rows = await self._run(lambda: self.pg_pool.fetch(
+                    'SELECT role, content, encoding FROM conversation_messages '
+                    'WHERE user_id = $1 ORDER BY seq DESC LIMIT $2',
+                    str(user_id), HISTORY_LIMIT
+                ))
+            else:
+                response = await self._run(self.supabase.table('conversation_messages')\
+                    .select('role,content,encoding')\
+                    .eq('user_id', str(user_id))\
+                    .order('seq', desc=True)\
+                    .limit(HISTORY_LIMIT)\
+                    .execute)
+                rows = response.data
             
-            if response.data and len(response.data) > 0:
-                messages = response.data[0]['messages']
+            if rows:
+                messages = [
+                    {'role': row['role'], 'content': _decode_content(row['content'], row.get('encoding'))}
+                    for row in reversed(rows)
+                ]
                 logger.info(f"Retrieved {len(messages)} messages for user {user_id}")
                 return messages
-            else:
-                logger.info(f"No conversation history found for user {user_id}")
+            
+            legacy_messages = await self._migrate_legacy_conversation(user_id)
+            if legacy_messages is None:
                 return []
+            if legacy_messages:
+                return legacy_messages[-HISTORY_LIMIT:]
+            
+            logger.info(f"No conversation history found for user {user_id}")
+            self._no_history[user_id] = True
+            return []
                 
         except Exception as e:
             logger.error(f"Error retrieving conversation for user {user_id}: {e}")
             return []
     
+    async def _migrate_legacy_conversation(self, user_id: int) -> list | None:
+        """Copy a user's history from user_conversations into conversation_messages
+        
+        Returns the migrated messages ([] if there were none), or None if the
+        legacy table couldn't be read.
+        """
+        if not self._legacy_table_available:
+            return []
+        
+        try:
+            response = await self._run(self.supabase.table('user_conversations')\
+                .select('messages')\
+                .eq('user_id', str(user_id))\
+                .execute)
+        except Exception as e:
+            if _is_missing_table_error(e):
+                logger.info("No legacy user_conversations table, skipping history migration")
+                self._legacy_table_available = False
+                return []
+            logger.error(f"Error reading legacy conversation for user {user_id}: {e}")
+            return None
+        
+        if not response.data:
+            return []
+        
+        # The system prompt used to be stored with the history; it is now added at request time
+        messages = [
+            {'role': message['role'], 'content': message['content']}
+            for message in response.data[0]['messages']
+            if message.get('role') != 'system'
+        ]
+        if messages:
+            await self.save_user_conversation(user_id, messages)
+            logger.info(f"Migrated {len(messages)} legacy messages for user {user_id}")
+        return messages
+    
     async def save_user_conversation(self, user_id: int, messages: list) -> bool:
-        """Save user's conversation history to Supabase"""
+        """Queue new messages to be appended to the user's history in Supabase"""
         if self.storage_mode != 'supabase' or not self.supabase:
             return False
         
+        item = (user_id, self._write_epochs.get(user_id, 0), list(messages))
+        try:
+            self._write_queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Drop the oldest queued write to make room rather than blocking the reply
+            dropped_user_id, _, _ = self._write_queue.get_nowait()
+            self._write_queue.task_done()
+            logger.warning(f"Write queue full, dropped queued messages for user {dropped_user_id}")
+            self._write_queue.put_nowait(item)
+        
+        self._no_history.pop(user_id, None)
+        return True
+    
+    async def _writer_loop(self):
+        """Drain the write queue, saving everything queued within a debounce window at once"""
+        while True:
+            batch = [await self._write_queue.get()]
+            try:
+                await asyncio.sleep(WRITE_DEBOUNCE_SECONDS)
+                
+                attempt = 0
+                while True:
+                    # Hold writes while Supabase's circuit is open instead of failing them
+                    while self._breaker.is_open():
+                        await asyncio.sleep(self._breaker.remaining())
+                    
+                    # Later writes join the batch behind the ones being retried, keeping per-user order
+                    while not self._write_queue.empty():
+                        batch.append(self._write_queue.get_nowait())
+                    
+                    if await self._write_batch(batch):
+                        break
+                    
+                    attempt += 1
+                    if attempt > WRITE_MAX_RETRIES:
+                        logger.error(f"Dropping {len(batch)} queued write(s) after {WRITE_MAX_RETRIES} retries")
+                        break
+                    await asyncio.sleep(WRITE_RETRY_BACKOFF * 2 ** (attempt - 1))
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+    
+    async def _write_batch(self, batch: list) -> bool:
+        """Append a batch of queued messages to Supabase in a single insert"""
+        # Skip messages queued before the user cleared their history
+        rows = []
+        for user_id, epoch, messages in batch:
+            if epoch != self._write_epochs.get(user_id, 0):
+                continue
+            
+            for message in messages:
+                content, encoding = _encode_content(message['content'])
+                rows.append({
+                    'user_id': str(user_id),
+                    'role': message['role'],
+                    'content': content,
+                    'encoding': encoding
+                })
+        
+        if not rows:
+            return True
+        
         try:
-            # Upsert the conversation
-            response = self.supabase.table('user_conversations').upsert({
-                'user_id': str(user_id),
-                'messages': messages,
-                'updated_at': 'now()'
-            }).execute()
-            
-            logger.info(f"Successfully saved conversation for user {user_id} ({len(messages)} messages)")
+            if self.pg_pool:
+                await self._run(lambda: self.pg_pool.executemany(
+                    'INSERT INTO conversation_messages (user_id, role, content, encoding) '
+                    'VALUES ($1, $2, $3, $4)',
+                    [(row['user_id'], row['role'], row['content'], row['encoding']) for row in rows]
+                ))
+            else:
+                response = await self._run(self.supabase.table('conversation_messages').insert(rows).execute)
+            
+            logger.info(f"Successfully saved {len(rows)} message(s) from {len(batch)} queued write(s)")
             return True
             
         except Exception as e:
-            logger.error(f"Error saving conversation for user {user_id}: {e}")
+            logger.error(f"Error saving {len(rows)} message(s) from {len(batch)} queued write(s): {e}")
             return False
     
+    async def close(self):
+        """Wait for queued conversation writes and release HTTP connections"""
+        if self._writer_task is not None:
+            try:
+                async with asyncio.timeout(WRITE_DEBOUNCE_SECONDS + SUPABASE_TIMEOUT):
+                    await self._write_queue.join()
+            except TimeoutError:
+                logger.warning(f"Gave up on {self._write_queue.qsize()} queued conversation write(s)")
+            
+            self._writer_task.cancel()
+            self._writer_task = None
+        
+        if self.pg_pool is not None:
+            await self.pg_pool.close()
+            self.pg_pool = None
+        
+        await self._http.aclose()
+    
     async def clear_user_conversation(self, user_id: int) -> bool:
         """Clear user's conversation history from Supabase"""
         if self.storage_mode != 'supabase' or not self.supabase:
             return False
         
+        # Invalidate queued saves so they don't bring the history back
+        self._write_epochs[user_id] = self._write_epochs.get(user_id, 0) + 1
+        
         try:
-            response = self.supabase.table('user_conversations')\
+            response = await self._run(self.supabase.table('conversation_messages')\
                 .delete()\
                 .eq('user_id', str(user_id))\
-                .execute()
+                .execute)
             
+            # Legacy rows must go too, or they would be migrated back on the next load
+            if self._legacy_table_available:
+                try:
+                    await self._run(self.supabase.table('user_conversations')\
+                        .delete()\
+                        .eq('user_id', str(user_id))\
+                        .execute)
+                except Exception as e:
+                    if not _is_missing_table_error(e):
+                        raise
+                    self._legacy_table_available = False
+            
+            self._no_history[user_id] = True
             logger.info(f"Successfully cleared conversation for user {user_id}")
             return True
             
@@ -178,9 +617,21 @@ class NeuralBot(commands.Bot):
         self.config_loaded = False
         
         # Store conversation history (local cache + Supabase)
-        self.conversations = {}  # Local cache for performance
+        self.conversations = OrderedDict()  # LRU cache of user_id -> deque of recent messages
+        self._history_loads: dict[int, asyncio.Task] = {}  # In-flight Supabase loads per user
+        
+        # Replies to identical opening messages, shared across users
+        self._response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
         
-        # AI response embed colors
+        # /help embed, rebuilt only when the guild/user counts it shows change
+        self._help_embed_cache = None
+        self._help_cache_stamp = (0, 0)
+        self._help_cache_ts = 0.0
+        
+        self._groq_breaker = CircuitBreaker('Groq')
+        self._groq_http = _new_http_client(timeout=30)
+        
+        # AI response embed colors (exactly four, so two random bits pick one)
         self.embed_colors = [
             0x87CEEB,  # Light blue
             0xDDA0DD,  # Light purple (plum)
@@ -190,31 +641,70 @@ class NeuralBot(commands.Bot):
     
     def get_random_embed_color(self):
         """Get a random color for AI response embeds"""
-        return random.choice(self.embed_colors)
+        return self.embed_colors[random.getrandbits(2)]
     
     async def setup_hook(self):
         """Called when the bot is starting up"""
         try:
+            # Make sure the async Supabase client exists (no-op if main() already did it)
+            await config.init()
+            
             # Load configuration from Supabase
             await self.load_configuration()
             
-            synced = await self.tree.sync()
-            logger.info(f"Synced {len(synced)} command(s)")
+            await self.sync_commands()
         except Exception as e:
             logger.error(f"Failed to sync commands: {e}")
     
+    def _command_tree_hash(self) -> str:
+        """Hash the command payload Discord receives so an unchanged tree can skip syncing"""
+        payload = [
+            cmd.to_dict(self.tree)
+            for cmd in sorted(self.tree.get_commands(), key=lambda c: c.name)
+        ]
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    
+    async def sync_commands(self):
+        """Sync slash commands only when needed
+        
+        DEV_GUILD_ID syncs to that guild only (instant, for development).
+        Otherwise the global sync runs when the command tree changed since the
+        last sync, or when SYNC_COMMANDS=1 forces it.
+        """
+        dev_guild_id = config.get_env_var_sync('DEV_GUILD_ID')
+        if dev_guild_id:
+            guild = discord.Object(id=int(dev_guild_id))
+            self.tree.copy_global_to(guild=guild)
+            synced = await self.tree.sync(guild=guild)
+            logger.info(f"Synced {len(synced)} command(s) to dev guild {dev_guild_id}")
+            return
+        
+        tree_hash = self._command_tree_hash()
+        force_sync = config.get_env_var_sync('SYNC_COMMANDS', '0') == '1'
+        
+        if not force_sync and await config.get_env_var('COMMAND_TREE_HASH') == tree_hash:
+            logger.info("Command tree unchanged, skipping global sync")
+            return
+        
+        synced = await self.tree.sync()
+        logger.info(f"Synced {len(synced)} command(s)")
+        await config.set_env_var('COMMAND_TREE_HASH', tree_hash)
+    
     async def load_configuration(self):
         """Load configuration from Supabase with fallback to local env"""
         try:
             logger.info("Loading configuration...")
             
+            # Prefix from Supabase overrides the local one used at construction time
+            self.command_prefix = await config.get_env_var('BOT_PREFIX', self.command_prefix)
+            
             # Get Groq API key
             groq_api_key = await config.get_env_var('GROQ_API_KEY')
             if not groq_api_key:
                 raise ValueError("GROQ_API_KEY not found in configuration")
             
-            # Initialize Groq client
-            self.groq_client = Groq(api_key=groq_api_key)
+            # Initialize Groq client on its own connection pool
+            self.groq_client = AsyncGroq(api_key=groq_api_key, http_client=self._groq_http)
             
             # Get AI model
             self.ai_model = await config.get_env_var('AI_MODEL', 'llama-3.1-70b-versatile')
@@ -229,7 +719,7 @@ class NeuralBot(commands.Bot):
             # Fallback to local env vars
             groq_api_key = os.getenv('GROQ_API_KEY')
             if groq_api_key:
-                self.groq_client = Groq(api_key=groq_api_key)
+                self.groq_client = AsyncGroq(api_key=groq_api_key, http_client=self._groq_http)
                 self.ai_model = os.getenv('AI_MODEL', 'llama-3.1-70b-versatile')
                 self.config_loaded = True
                 logger.info("Fallback configuration loaded successfully")
@@ -237,6 +727,12 @@ class NeuralBot(commands.Bot):
                 logger.error("No GROQ_API_KEY found in local environment either!")
                 raise
     
+    async def close(self):
+        """Flush pending Supabase writes and release Groq connections before disconnecting"""
+        await config.close()
+        await self._groq_http.aclose()
+        await super().close()
+    
     async def on_ready(self):
         """Called when the bot has successfully connected to Discord"""
         logger.info(f'{self.user} has landed!')
@@ -250,6 +746,14 @@ class NeuralBot(commands.Bot):
             )
         )
     
+    async def on_guild_join(self, guild):
+        """Invalidate the cached /help embed when the server count changes"""
+        self._help_embed_cache = None
+    
+    async def on_guild_remove(self, guild):
+        """Invalidate the cached /help embed when the server count changes"""
+        self._help_embed_cache = None
+    
     async def on_command_error(self, ctx, error):
         """Global error handler"""
         if isinstance(error, commands.CommandNotFound):
@@ -263,63 +767,124 @@ class NeuralBot(commands.Bot):
                 ephemeral=True
             )
     
-    async def get_ai_response(self, user_id: int, message: str) -> str:
-        """Get AI response from Groq API with Supabase conversation storage"""
+    async def get_ai_response(
+        self,
+        user_id: int,
+        message: str,
+        on_partial: Callable[[str], Awaitable[None]] = None
+    ) -> str:
+        """Get AI response from Groq API with Supabase conversation storage
+        
+        If on_partial is given, it is awaited with the text received so far
+        while the reply streams in (at most once per STREAM_EDIT_INTERVAL).
+        """
         try:
             # Get or load conversation history for user
             if user_id not in self.conversations:
-                # Try to load from Supabase first
-                saved_conversation = await config.get_user_conversation(user_id)
+                # Concurrent first messages share one load, so legacy history is migrated only once
+                load = self._history_loads.get(user_id)
+                if load is None:
+                    load = asyncio.create_task(config.get_user_conversation(user_id))
+                    self._history_loads[user_id] = load
+                    load.add_done_callback(lambda _: self._history_loads.pop(user_id, None))
                 
+                saved_conversation = await asyncio.shield(load)
+            
+            if user_id not in self.conversations:
                 if saved_conversation:
-                    self.conversations[user_id] = saved_conversation
                     logger.info(f"Loaded conversation history for user {user_id} from Supabase")
-                else:
-                    # Create new conversation with system message
-                    self.conversations[user_id] = [
-                        {
-                            "role": "system",
-                            "content": (
-                                "You are Neural, an intelligent and helpful Discord bot. "
-                                "You're enthusiastic and always try to be helpful. "
-                                "Keep responses concise but informative. "
-                                "If someone asks about your capabilities, mention that you can chat, "
-                                "help with questions, and provide information on various topics."
-                            )
-                        }
-                    ]
+                
+                # The deque drops the oldest messages once HISTORY_LIMIT is reached
+                self.conversations[user_id] = deque(saved_conversation, maxlen=HISTORY_LIMIT)
+            else:
+                self.conversations.move_to_end(user_id)
+            
+            history = self.conversations[user_id]
+            
+            # An opening message has no context beyond the system prompt, so its reply can be reused
+            cache_key = None
+            if not history:
+                cache_key = hashlib.blake2b(message.strip().lower().encode()).hexdigest()
             
             # Add user message to conversation
-            self.conversations[user_id].append({
+            user_message = {
                 "role": "user",
                 "content": message
-            })
-            
-            # Keep conversation history manageable (last 20 messages + system message)
-            if len(self.conversations[user_id]) > 21:  # 1 system + 20 messages
-                self.conversations[user_id] = (
-                    [self.conversations[user_id][0]] +  # Keep system message
-                    self.conversations[user_id][-20:]   # Keep last 20 messages
-                )
+            }
+            history.append(user_message)
             
-            # Get response from Groq
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=self.conversations[user_id],
-                model=self.ai_model,
-                max_tokens=1000,
-                temperature=0.7
-            )
+            ai_response = self._response_cache.get(cache_key) if cache_key else None
             
-            ai_response = chat_completion.choices[0].message.content
+            if ai_response is None:
+                # Fail fast while Groq is down instead of piling up more stuck calls
+                if self._groq_breaker.is_open():
+                    raise CircuitOpenError("Groq circuit is open")
+                
+                chunks = []
+                # Partial updates run as a background task so slow Discord edits never
+                # count against the Groq timeout; updates arriving mid-edit are skipped
+                update_task = None
+                try:
+                    # Stream response from Groq
+                    async with asyncio.timeout(GROQ_TIMEOUT):
+                        stream = await self.groq_client.chat.completions.create(
+                            messages=[_SYSTEM_MSG, *history],
+                            model=self.ai_model,
+                            max_tokens=1000,
+                            temperature=0.7,
+                            stream=True
+                        )
+                        
+                        last_update = time.monotonic()
+                        # Closing the stream releases its pooled connection on timeouts/errors too
+                        async with stream:
+                            async for chunk in stream:
+                                delta = chunk.choices[0].delta.content
+                                if not delta:
+                                    continue
+                                
+                                chunks.append(delta)
+                                now = time.monotonic()
+                                if (
+                                    on_partial
+                                    and now - last_update > STREAM_EDIT_INTERVAL
+                                    and (update_task is None or update_task.done())
+                                ):
+                                    last_update = now
+                                    update_task = asyncio.create_task(on_partial(''.join(chunks)))
+                except Exception:
+                    self._groq_breaker.record_failure()
+                    if update_task is not None:
+                        update_task.cancel()
+                    raise
+                
+                self._groq_breaker.record_success()
+                
+                # Let the last partial update land before the caller sends the final reply
+                if update_task is not None:
+                    await asyncio.gather(update_task, return_exceptions=True)
+                
+                ai_response = ''.join(chunks)
+                
+                # An empty reply (e.g. a stream with no content) must not be served to others
+                if cache_key and ai_response:
+                    self._response_cache[cache_key] = ai_response
+            else:
+                logger.info(f"Served cached response for user {user_id}")
             
             # Add AI response to conversation history
-            self.conversations[user_id].append({
+            assistant_message = {
                 "role": "assistant",
                 "content": ai_response
-            })
+            }
+            history.append(assistant_message)
+            
+            # Queue the new user/assistant pair for the next batched Supabase write
+            await config.save_user_conversation(user_id, [user_message, assistant_message])
             
-            # Save updated conversation to Supabase (async, don't wait)
-            asyncio.create_task(config.save_user_conversation(user_id, self.conversations[user_id]))
+            # Evict the least recently active user; their history is already queued for Supabase
+            if len(self.conversations) > MAX_CACHED_CONVERSATIONS:
+                self.conversations.popitem(last=False)
             
             return ai_response
             
@@ -337,17 +902,28 @@ async def chat(interaction: discord.Interaction, message: str):
     await interaction.response.defer()
     
     try:
-        # Get AI response
-        ai_response = await bot.get_ai_response(interaction.user.id, message)
+        # Same color for every edit so the embed doesn't flicker while streaming
+        color = bot.get_random_embed_color()
+        
+        async def show_partial(text: str):
+            try:
+                await interaction.edit_original_response(
+                    embed=discord.Embed(description=text + "▍", color=color)
+                )
+            except discord.HTTPException as e:
+                logger.warning(f"Failed to update streaming response: {e}")
+        
+        # Get AI response, showing it progressively as it streams in
+        ai_response = await bot.get_ai_response(interaction.user.id, message, on_partial=show_partial)
         
         # Create embed for response
         embed = discord.Embed(
             description=ai_response,
-            color=bot.get_random_embed_color()
+            color=color
         )
         embed.set_footer(text=f"✦ Neural Response")
         
-        await interaction.followup.send(embed=embed)
+        await interaction.edit_original_response(embed=embed)
         
     except Exception as e:
         logger.error(f"Chat command error: {e}")
@@ -399,6 +975,18 @@ async def clear_history(interaction: discord.Interaction):
 @bot.tree.command(name="help", description="Get information about Neural")
 async def bot_info(interaction: discord.Interaction):
     """Display bot information"""
+    # Within the TTL the cached embed is sent as-is; after it, only a count change forces a rebuild
+    now = time.monotonic()
+    if bot._help_embed_cache is not None and now - bot._help_cache_ts < HELP_CACHE_TTL:
+        await interaction.response.send_message(embed=bot._help_embed_cache)
+        return
+    
+    stamp = (len(bot.guilds), len(bot.users))
+    if bot._help_embed_cache is not None and bot._help_cache_stamp == stamp:
+        bot._help_cache_ts = now
+        await interaction.response.send_message(embed=bot._help_embed_cache)
+        return
+    
     embed = discord.Embed(
         title="About Neural",
         description="I'm an AI-powered Discord bot ready to chat and help!",
@@ -413,13 +1001,13 @@ async def bot_info(interaction: discord.Interaction):
     
     embed.add_field(
         name="📊 Servers",
-        value=f"`{len(bot.guilds)}`",
+        value=f"`{stamp[0]}`",
         inline=True
     )
     
     embed.add_field(
         name="👥 Users",
-        value=f"`{len(bot.users)}`",
+        value=f"`{stamp[1]}`",
         inline=True
     )
     
@@ -436,6 +1024,10 @@ async def bot_info(interaction: discord.Interaction):
     
     embed.set_thumbnail(url=bot.user.avatar.url if bot.user.avatar else None)
     
+    bot._help_embed_cache = embed
+    bot._help_cache_stamp = stamp
+    bot._help_cache_ts = now
+    
     await interaction.response.send_message(embed=embed)
 
 @bot.tree.command(name="ping", description="Check if Neural is responsive")
@@ -471,6 +1063,12 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
 async def main():
     """Main function to run the bot"""
     try:
+        # The token is needed before login, so the Supabase client is created here
+        await config.init()
+        
+        # Fetch all configuration in one round-trip; later lookups hit the cache
+        await config.prime_env_cache()
+        
         # Get Discord token (try Supabase first, then local env)
         discord_token = await config.get_env_var('DISCORD_TOKEN')
         
@@ -496,6 +1094,10 @@ async def main():
             await bot.start(token)
         except Exception as e2:
             logger.error(f"Fallback also failed: {e2}")
+    
+    finally:
+        if not bot.is_closed():
+            await bot.close()
 
 if __name__ == "__main__":
     asyncio.run(main())